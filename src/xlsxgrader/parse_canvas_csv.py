@@ -1,50 +1,157 @@
+import csv
+import hashlib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
-import openpyxl
+import xlsxwriter
+
+# the number of informational columns before (id, section, section_id, submitted, attempt)
+# and after (n correct, n incorrect, score) the question columns in the Canvas CSV export
+_INFO_START = 5
+_INFO_END = 3
+
+# parsed CSV files are cached in this directory (next to the CSV file) as Arrow IPC files
+_CACHE_DIR_NAME = '.xlsxgrader-cache'
+# the version of the cached data; increment this whenever the parsed output or the cache format changes
+_CACHE_VERSION = 1
+# the dataframes in the question data that are cached
+_CACHED_FRAMES = ['question_text', 'responses', 'grades', 'max_grades']
+
+def _cache_path(csv_file_path : str | Path):
+    """ Get the cache directory for a CSV file and the key that identifies the current version of the file. """
+    csv_file_path = Path(csv_file_path).resolve()
+    stat = csv_file_path.stat()
+    # there is one cache directory per CSV file, so that the cache is overwritten when the CSV file changes
+    cache_path = csv_file_path.parent / _CACHE_DIR_NAME / hashlib.sha1(str(csv_file_path).encode()).hexdigest()
+    key = f"{_CACHE_VERSION}:{stat.st_mtime_ns}:{stat.st_size}"
+    return cache_path, key
+
+def _load_cache(cache_path : Path, key : str):
+    """ Load cached question data; raises OSError if there is no cached data for this key. """
+    if (cache_path / 'key').read_text() != key:
+        raise FileNotFoundError(f"Cached data in {cache_path} is out of date")
+
+    frames = {}
+    for frame_name in _CACHED_FRAMES + ['responses_to_grade']:
+        # memory map the file so that Arrow can read it without copying
+        with pa.memory_map(str(cache_path / f'{frame_name}.arrow')) as source:
+            frames[frame_name] = pa.ipc.open_file(source).read_all().to_pandas()
+
+    # the questions to grade are stored as a one-column dataframe
+    responses_to_grade_columns = pd.Index(frames['responses_to_grade']['responses_to_grade'].to_numpy())
+
+    # collect the question data into a dictionary
+    question_data = {
+        'question_text': frames['question_text'],
+        'responses': frames['responses'],
+        'grades': frames['grades'],
+        'responses_to_grade': responses_to_grade_columns,
+        'max_grades': frames['max_grades']
+    }
+
+    return question_data
+
+def _save_cache(question_data, cache_path : Path, key : str):
+    """ Save the question data to the cache. """
+    cache_path.mkdir(parents=True, exist_ok=True)
+    # invalidate the old cached data before overwriting it; the key is written last
+    (cache_path / 'key').unlink(missing_ok=True)
+    frames = {frame_name: question_data[frame_name] for frame_name in _CACHED_FRAMES}
+    frames['responses_to_grade'] = pd.DataFrame({'responses_to_grade': list(question_data['responses_to_grade'])})
+    for frame_name, df in frames.items():
+        table = pa.Table.from_pandas(df)
+        with pa.ipc.new_file(str(cache_path / f'{frame_name}.arrow'), table.schema) as writer:
+            writer.write_table(table)
+    (cache_path / 'key').write_text(key)
 
 def parse_canvas_csv(csv_file_path : str | Path):
-    """ Parse a CSV file exported from Canvas and return a cleaned-up DataFrame. """
-    # load the CSV file; index is student name
-    data = pd.read_csv(csv_file_path, index_col='name')
+    """ Parse a CSV file exported from Canvas and return a cleaned-up DataFrame.
+
+    The result is cached next to the CSV file and reused until the CSV file changes.
+    """
+    cache_path, key = _cache_path(csv_file_path)
+    try:
+        return _load_cache(cache_path, key)
+    except (OSError, pa.ArrowException):
+        # nothing usable in the cache; parse the CSV file
+        pass
+
+    question_data = _parse_canvas_csv(csv_file_path)
+
+    # caching is best-effort (e.g., the directory might not be writable)
+    try:
+        _save_cache(question_data, cache_path, key)
+    except (OSError, pa.ArrowException):
+        pass
+
+    return question_data
+
+def _parse_canvas_csv(csv_file_path : str | Path):
+    """ Parse a CSV file exported from Canvas (without using the cache). """
+    # read the header row on its own; the column names hold the question text and the maximum score for each question
+    with open(csv_file_path, newline='', encoding='utf-8-sig') as csv_file:
+        header = next(csv.reader(csv_file))
+
+    # the student name column becomes the index; the other columns are used by position
+    name_position = header.index('name')
+    column_positions = [i for i in range(len(header)) if i != name_position]
 
     # determine the number of questions
     # the columns are formatted as follows: id, section, section_id, submitted, attempt, question1, score1, question2, score2, question3, score3, ..., n correct, n incorrect, score
     # we can use the number of columns to determine the number of questions
-    informational_columns_start = ['id', 'section', 'section_id', 'submitted', 'attempt']
-    informational_columns_end = ['n correct', 'n incorrect', 'score']
-    informational_columns = informational_columns_start + informational_columns_end
-    num_informational_columns = len(informational_columns)
-    num_informational_columns_start = len(informational_columns_start)
-    num_informational_columns_end = len(informational_columns_end)
-    num_columns = len(data.columns)
+    num_informational_columns = _INFO_START + _INFO_END
+    num_columns = len(column_positions)
     num_questions = (num_columns - num_informational_columns) // 2
 
     # check that the number of columns is consistent with the number of questions
     if num_columns != num_informational_columns + 2 * num_questions:
         raise RuntimeError(f"Unexpected number of columns: {num_columns}")
 
-    # extract the response columns
-    response_columns = data.columns[num_informational_columns_start:-num_informational_columns_end:2]
-
-    # extract the grade columns
-    grade_columns = data.columns[num_informational_columns_start+1:-num_informational_columns_end:2]
-
-    # extract the questions and the answers; copy the data to a new dataframe
-    responses = data[response_columns].copy()
-    grades = data[grade_columns].copy()
-
-    # determine which questions need to be graded by checking if all the scores are 0
-    grade_columns_that_sum_to_zero = data[grade_columns].sum() == 0
+    # find the response and grade columns (they alternate)
+    response_positions = column_positions[_INFO_START:-_INFO_END:2]
+    grade_positions = column_positions[_INFO_START+1:-_INFO_END:2]
+
+    # the grade column names are not unique (e.g., 1.0, 1.0, 2.0), so give every column a unique name by position
+    arrow_column_names = ['name' if i == name_position else f'column {i}' for i in range(len(header))]
+    response_columns = [arrow_column_names[i] for i in response_positions]
+    grade_columns = [arrow_column_names[i] for i in grade_positions]
+
+    # load the CSV file with Arrow's multithreaded parser, skipping the informational columns; index is student name
+    # (skip_rows_after_names skips the header record, which may span several lines)
+    table = pacsv.read_csv(
+        csv_file_path,
+        read_options=pacsv.ReadOptions(use_threads=True, column_names=arrow_column_names, skip_rows_after_names=1),
+        # responses may contain line breaks
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=['name'] + response_columns + grade_columns,
+            # responses are free text and must not be type-inferred (e.g., a date-looking answer stays as written)
+            column_types={
+                **{column: pa.string() for column in response_columns},
+                **{column: pa.float64() for column in grade_columns},
+            },
+            strings_can_be_null=True,
+        ),
+    )
+    data = table.to_pandas(split_blocks=True, self_destruct=True).set_index('name')
+
+    # extract the questions and the answers
+    responses = data[response_columns]
+    grades = data[grade_columns]
+
+    # determine which questions need to be graded by checking if all the scores are 0 (missing scores count as 0)
+    grades_array = np.nan_to_num(grades.to_numpy(dtype=float))
+    needs_grading = ~grades_array.any(axis=0)
 
     # Extract the question text from each response column name
-    question_text = [column.split(': ')[1] for column in responses.columns]
+    question_text = [header[i].split(': ')[1] for i in response_positions]
 
     # Extract the maximum score for each question from the grade column names
-    # note that Pandas automatically appends a .1, .2, etc. to the column names if there are duplicates
-    # so we need to extract the unique question numbers and then find the corresponding maximum score
-    grade_column_names = grades.columns
-    # check if there is more than one decimal point in the column names, and remove everything following the second decimal point
-    maximum_grades = [int(column.split('.', 2)[0]) for column in grade_column_names]
+    grade_column_names = [header[i] for i in grade_positions]
+    # keep the integer part of each column name (everything before the first decimal point)
+    maximum_grades = pd.Index(grade_column_names).str.split('.', n=1).str[0].astype(np.int64).to_numpy()
 
     # generate new column names as Question 1, Question 2, etc.
     new_column_names = [f'Question {i+1}' for i in range(len(question_text))]
@@ -54,8 +161,7 @@ def parse_canvas_csv(csv_file_path : str | Path):
     grades.columns = new_column_names
 
     # get the columns of the questions to grade (this is done after renaming the columns to Question 1, Question 2, etc.)
-    responses_to_grade_bool = grade_columns_that_sum_to_zero.values
-    responses_to_grade_columns = responses.columns[responses_to_grade_bool]
+    responses_to_grade_columns = responses.columns[needs_grading]
 
     # make a pandas dataframe for the maximum grades
     max_grades_df = pd.DataFrame(maximum_grades, index=new_column_names, columns=['Max Grade']).T
@@ -64,22 +170,21 @@ def parse_canvas_csv(csv_file_path : str | Path):
     question_text_df = pd.DataFrame(question_text, index=new_column_names, columns=['Question Text']).T
 
     # parse the last name and first name from the index
-    last_names = [name.split(' ')[-1] for name in data.index]
-    first_names = [' '.join(name.split(' ')[:-1]) for name in data.index]
+    # (rpartition leaves the first name empty for single-word names; reindex in case there are no students)
+    names = data.index.to_series().str.rpartition(' ').reindex(columns=[0, 1, 2])
+    first_names = names[0].to_numpy()
+    last_names = names[2].to_numpy()
 
     # add last name and first name columns to grades and responses
-    grades.loc[:,'Last Name'] = last_names
-    grades.loc[:,'First Name'] = first_names
-    responses.loc[:,'Last Name'] = last_names
-    responses.loc[:,'First Name'] = first_names
-
-    # make last name and first name the first two columns
-    grades = grades[['Last Name', 'First Name'] + list(grades.columns[:-2])]
-    responses['Last Name'] = last_names
-    
-    # sort the dataframes by last name
-    grades = grades.sort_values(by='Last Name')
-    responses = responses.sort_values(by='Last Name')
+    name_columns = {'Last Name': last_names, 'First Name': first_names}
+    responses = responses.assign(**name_columns)
+    # make last name and first name the first two columns of grades
+    grades = grades.assign(**name_columns)[['Last Name', 'First Name'] + new_column_names]
+
+    # sort the dataframes by last name (the sort order is computed once and shared by both)
+    order = np.argsort(last_names, kind='stable')
+    grades = grades.iloc[order]
+    responses = responses.iloc[order]
 
     # collect the question data into a dictionary
     question_data = {
@@ -92,6 +197,31 @@ def parse_canvas_csv(csv_file_path : str | Path):
 
     return question_data
 
+def _to_cell_values(column : pd.Series):
+    """ Convert a column to a numpy array of values that can be written to the xlsx file (missing values become blank cells). """
+    return column.astype(object).where(column.notna(), None).to_numpy()
+
+def _formula_templates(questions, questions_to_grade):
+    """ Build templates for the total score and comment formulas; `{row}` is a placeholder for the row number. """
+    # total score (use formulas to connect to the data in the other sheets)
+    total_score_template = "=SUM(" + ",".join(f"'{question}'!C{{row}}" for question in questions) + ")"
+
+    # comments
+    # use a formula to construct the comments in the following format:
+    # "Question 1 (score/max score): comments; Question 2 (score/max score): comments; ..."
+    comment_items = [
+        f'"{question} (",'
+        f"'{question}'!C{{row}},"
+        '"/",'
+        f"'{question}'!D{{row}}"
+        ',") ",'
+        f"'{question}'!E{{row}}"
+        for question in questions_to_grade
+    ]
+    comment_template = "=CONCATENATE(" + ',CHAR(10),"|",CHAR(10),'.join(comment_items) + ")"
+
+    return total_score_template, comment_template
+
 def save_to_xlsx(question_data, xlsx_file_path : str | Path):
     """ Save the question data to an xlsx file. """
 
@@ -102,165 +232,141 @@ def save_to_xlsx(question_data, xlsx_file_path : str | Path):
     worksheet_names.remove('Last Name')
     worksheet_names.remove('First Name')
 
-    # create a new workbook
-    wb = openpyxl.Workbook()
-
-    # rename the first sheet
-    wb.active.title = worksheet_names[0]
-
-    # create the worksheets
-    for sheet_name in worksheet_names[1:]:
-        wb.create_sheet(sheet_name)
+    # create a new workbook; in constant memory mode each row is flushed to disk once the next row is started,
+    # so every worksheet has to be written top to bottom
+    # (formulas are always written with write_formula, so strings starting with '=' are never turned into formulas)
+    wb = xlsxwriter.Workbook(xlsx_file_path, {'constant_memory': True, 'strings_to_formulas': False})
+
+    # create the cell formats up front so that they can be shared by every cell that uses them
+    # (the total score column is centered and rounded to the first decimal place)
+    score_properties = {'align': 'center', 'num_format': '0.0'}
+    italic_format = wb.add_format({'italic': True})
+    bold_format = wb.add_format({'bold': True})
+    wrap_format = wb.add_format({'text_wrap': True})
+    score_format = wb.add_format(score_properties)
+    score_header_format = wb.add_format({'bold': True, **score_properties})
+    # the rows of the total scores sheet alternate between a white and a grey style; the student name column is bold
+    row_styles = []
+    for color in ["FFFFFF", "DDDDDD"]:
+        fill_properties = {'bg_color': f"#{color}", 'pattern': 1}
+        row_styles.append({
+            'name': wb.add_format({'bold': True, **fill_properties}),
+            'fill': wb.add_format(fill_properties),
+            'score': wb.add_format({**score_properties, **fill_properties}),
+        })
+
+    # create the worksheets (the total scores sheet comes first)
+    for sheet_name in worksheet_names:
+        wb.add_worksheet(sheet_name)
+
+    # keep a reference to each worksheet so that they don't need to be looked up by name
+    ws_map = {sheet_name: wb.get_worksheet_by_name(sheet_name) for sheet_name in worksheet_names}
+
+    # pull the student names and the per-question responses/grades out of the dataframes once
+    names = question_data['responses'].index.to_numpy()
+    responses_np = {sheet_name: _to_cell_values(question_data['responses'][sheet_name]) for sheet_name in worksheet_names[1:]}
+    grades_np = {sheet_name: _to_cell_values(question_data['grades'][sheet_name]) for sheet_name in worksheet_names[1:]}
 
     # insert the question/response data into the question worksheets
     for sheet_name in worksheet_names[1:]:
-        ws = wb[sheet_name]
-        # set cell C1 to the question text for each question worksheet
-        ws['C1'] = question_data['question_text'][sheet_name].values[0]
-        ws.append(['Student Name', 'Response', "Score", "Max Score", "Comments"])
-        # make the first row italic
-        for cell in ws[1]:
-            cell.font = openpyxl.styles.Font(italic=True)
-        # make the second row bold
-        for cell in ws[2]:
-            cell.font = openpyxl.styles.Font(bold=True)
-        # iterate over the rows in the responses dataframe and insert them into the worksheet
-        for row, grade_row in zip(question_data['responses'].iterrows(), question_data['grades'].iterrows()):
-            # name
-            new_row = [row[0]]
-            # response
-            new_row.append(row[1][sheet_name])
-            # score
-            new_row.append(grade_row[1][sheet_name])
-            # max score
-            new_row.append(question_data['max_grades'][sheet_name].values[0])
-            # comments
-            new_row.append('')
-            ws.append(new_row)
-
-        # set the width of the second column and turn on text wrapping
-        ws.column_dimensions['B'].width = 50
-        ws.column_dimensions['B'].bestFit = True
-        ws.column_dimensions['B'].auto_size = True
-
-        # set row heights based on column B
-        for row in ws.iter_rows(min_row=3, max_row=ws.max_row, min_col=2, max_col=2):
-            for cell in row:
-                cell.alignment = openpyxl.styles.Alignment(wrap_text=True)
-
-        # freeze rows 1 and 2
-        ws.freeze_panes = ws['A3']
+        ws = ws_map[sheet_name]
 
         # hide column A
-        ws.column_dimensions['A'].hidden = True
-
+        ws.set_column('A:A', None, None, {'hidden': True})
 
-    # create the total scores worksheet from scratch
-    ws1 = wb[worksheet_names[0]]
-    ws1.append([]) # add an empty row so that this sheet matches the others
-    columns = ['Full Student Name', 'Last Name', 'First Name', 'Total Score', 'Comments']
-    ws1.append(columns)
-    # make the first row bold
-    for cell in ws1[2]:
-        cell.font = openpyxl.styles.Font(bold=True)
-    # set the current row
-    start_row = 3
+        # set the width of the second column
+        ws.set_column('B:B', 50)
 
-    current_color = "FFFFFF"
+        # freeze rows 1 and 2
+        ws.freeze_panes(2, 0)
 
-    # populate the rows
-    for n, row in enumerate(question_data['responses'].iterrows()):
-        # set the current row
-        current_row = start_row + n
+        # get the maximum score for this question
+        max_score = question_data['max_grades'].at['Max Grade', sheet_name]
 
-        # name
-        new_row = [row[0]]
-
-        # last name
-        new_row.append(row[1]['Last Name'])
-        
-        # first name
-        new_row.append(row[1]['First Name'])
-
-        # total score (use formulas to connect to the data in the other sheets)
-        total_score_formula = "=SUM("
-        for question in worksheet_names[1:]:
-            total_score_formula += f"'{question}'!C{current_row},"
-        total_score_formula = total_score_formula[:-1] + ")"
-        # total score
-        new_row.append(total_score_formula)
+        # set cell C1 to the question text for each question worksheet (in italics)
+        ws.write(0, 2, question_data['question_text'][sheet_name].values[0], italic_format)
+        # make the second row bold
+        ws.write_row(1, 0, ['Student Name', 'Response', "Score", "Max Score", "Comments"], bold_format)
 
-        # comments
-        # use a formula to construct the comments in the following format:
-        # "Question 1 (score/max score): comments; Question 2 (score/max score): comments; ..."
-        comment_formula = "=CONCATENATE("
-
-        for n, question in enumerate(question_data['responses_to_grade']):
-            item = f'"{question} (",'
-            item += f"'{question}'!C{current_row},"
-            item += '"/",'
-            item += f"'{question}'!D{current_row}"
-            item += ',") ",'
-            item += f"'{question}'!E{current_row}"
-            if n < len(question_data['responses_to_grade']) - 1:
-                item += ',CHAR(10),"|",CHAR(10),'
+        # insert the responses and grades for each student into the worksheet
+        for i, name in enumerate(names):
+            row_idx = i + 2
+            # name
+            ws.write(row_idx, 0, name)
+            # response (turn on text wrapping); responses are always written as text
+            response = responses_np[sheet_name][i]
+            if response is None:
+                ws.write_blank(row_idx, 1, None, wrap_format)
             else:
-                item += ')'
-            comment_formula += item
-        new_row.append(comment_formula)
-
-        # append the row
-        ws1.append(new_row)
-
-        # set the color of the row
-        for cell in ws1[current_row]:
-            cell.fill = openpyxl.styles.PatternFill(start_color=current_color, end_color=current_color, fill_type="solid")
-
-        # alternate the color
-        if current_color == "FFFFFF":
-            current_color = "DDDDDD"
-        elif current_color == "DDDDDD":
-            current_color = "FFFFFF"
-        
-        # increment the current row
-        current_row += 1
-    
-    # make the student name column bold
-    for cell in ws1['A']:
-        cell.font = openpyxl.styles.Font(bold=True)
-    
+                ws.write_string(row_idx, 1, response, wrap_format)
+            # score, max score, comments
+            ws.write_row(row_idx, 2, [grades_np[sheet_name][i], max_score, ''])
+
+
+    # create the total scores worksheet from scratch
+    ws1 = ws_map[worksheet_names[0]]
+
     # auto set the name column width
-    ws1.column_dimensions['A'].width = 15
+    ws1.set_column('A:A', 15)
+
+    # hide columns B and C
+    ws1.set_column('B:C', None, None, {'hidden': True})
 
     # set the width of the grade column
-    ws1.column_dimensions['D'].width = 15
+    ws1.set_column('D:D', 15)
 
     # set the width of the comment column
-    ws1.column_dimensions['E'].width = 50
+    ws1.set_column('E:E', 50)
 
-    for cell in ws1['D']:
-        # use center justification for the total score column
-        cell.alignment = openpyxl.styles.Alignment(horizontal='center')
-        # format the total score column to round to the first decimal place
-        cell.number_format = '0.0'
+    # freeze column A
+    ws1.freeze_panes(0, 1)
 
-    # put the maximum score in cell D1
-    ws1['D1'] = f"Max Score: {sum(question_data['max_grades'].values[0])}"
+    # put the maximum score in cell D1 (the first row is otherwise empty so that this sheet matches the others)
+    ws1.write(0, 3, f"Max Score: {sum(question_data['max_grades'].values[0])}", score_format)
 
-    # freeze column A
-    ws1.freeze_panes = ws1['B1']
+    # make the header row bold
+    ws1.write_row(1, 0, ['Full Student Name', 'Last Name', 'First Name'], bold_format)
+    ws1.write(1, 3, 'Total Score', score_header_format)
+    ws1.write(1, 4, 'Comments', bold_format)
 
-    # hide columns B and C
-    ws1.column_dimensions['B'].hidden = True
-    ws1.column_dimensions['C'].hidden = True
+    # build the formulas once; only the row number changes from student to student
+    total_score_template, comment_template = _formula_templates(worksheet_names[1:], question_data['responses_to_grade'])
+
+    # set the current row
+    start_row = 3
+
+    # populate the rows
+    # (only the name columns are needed, so narrow the dataframe before iterating over it)
+    name_data = question_data['responses'][['Last Name', 'First Name']]
+    for n, (full_name, last_name, first_name) in enumerate(name_data.itertuples(index=True, name=None)):
+        # set the current row
+        current_row = start_row + n
+
+        # fill in the row number in the total score and comment formulas
+        total_score_formula = total_score_template.format(row=current_row)
+        comment_formula = comment_template.format(row=current_row)
+
+        # set the color of the row (alternating white and grey)
+        formats = row_styles[n % 2]
+
+        # write the row (note that xlsxwriter rows are 0-indexed)
+        row_idx = current_row - 1
+        # name
+        ws1.write(row_idx, 0, full_name, formats['name'])
+        # last name, first name
+        ws1.write_row(row_idx, 1, [last_name, first_name], formats['fill'])
+        # total score
+        ws1.write_formula(row_idx, 3, total_score_formula, formats['score'])
+        # comments
+        ws1.write_formula(row_idx, 4, comment_formula, formats['fill'])
 
     # get the first question to be graded
     first_question_to_grade = str(question_data['responses_to_grade'][0])
 
     # set the active worksheet to be the first question that needs to be graded
-    wb.active = wb[first_question_to_grade]
+    ws_map[first_question_to_grade].activate()
 
     # save the xlsx file
-    wb.save(xlsx_file_path)
+    wb.close()
 
     return
@@ -2,8 +2,27 @@
 """ xlsxgrader - a tool for converting assignment exports from a CSV format to an xlsx format for grading purposes. """
 from xlsxgrader import parse_canvas_csv
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+def _default_output_file(file):
+    """ Gets the default output file for a CSV file."""
+    # strip the .csv extension and add .xlsx and save to the current directory
+    # get the file name from file
+    return Path(file).with_suffix('.xlsx').name
+
+def _process_one(file, output_override):
+    """ Converts a single CSV file to an xlsx file."""
+    question_data = parse_canvas_csv.parse_canvas_csv(file)
+
+    # if an output file was specified, use that
+    if output_override != "":
+        output_file = output_override
+    else:
+        output_file = _default_output_file(file)
+    parse_canvas_csv.save_to_xlsx(question_data, output_file)
+
 def main_cli():
     parser = argparse.ArgumentParser(description='Convert a CSV file to an xlsx file for grading purposes.')
     # allow multiple files to be converted at once
@@ -17,18 +36,19 @@ def main_cli():
         print("Error: cannot specify an output file when converting multiple files")
         return
 
-    # convert each file
-    for file in args.files:
-        question_data = parse_canvas_csv.parse_canvas_csv(file)
+    # check that no two input files would be written to the same output file (e.g., a/quiz.csv and b/quiz.csv);
+    # the names are compared case-insensitively, since file names are case-insensitive on macOS and Windows
+    output_files = {os.path.normcase(_default_output_file(file)).casefold() for file in args.files}
+    if num_files > 1 and len(output_files) != num_files:
+        print("Error: multiple input files would be converted to the same output file")
+        return
 
-        # if an output file was specified, use that
-        if args.output != "":
-            parse_canvas_csv.save_to_xlsx(question_data, args.output)
-        else:
-            # strip the .csv extension and add .xlsx and save to the current directory
-            # get the file name from file
-            output_file = Path(file).with_suffix('.xlsx').name
-            parse_canvas_csv.save_to_xlsx(question_data, output_file)
+    # convert each file; the files are independent, so convert multiple files in parallel
+    if num_files > 1:
+        with ProcessPoolExecutor() as executor:
+            list(executor.map(_process_one, args.files, [""] * num_files))
+    else:
+        _process_one(args.files[0], args.output)
 
 def main_gui():
     """ Provides a drag-and-drop interface for converting files."""
@@ -0,0 +1,82 @@
+import csv
+
+from xlsxgrader import parse_canvas_csv as parse_canvas_csv_module
+from xlsxgrader.parse_canvas_csv import parse_canvas_csv
+
+HEADER = [
+    'name', 'id', 'section', 'section_id', 'submitted', 'attempt',
+    '111: What is 2+2?', '1.0',
+    '112: Explain gravity.', '2.0',
+    'n correct', 'n incorrect', 'score',
+]
+
+def write_canvas_csv(path, header, rows):
+    """ Write a Canvas-style CSV export. """
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+def student_row(name, response_1, score_1, response_2, score_2):
+    return [name, 1, 'Sec A', 10, '2024-01-01 10:00:00 UTC', 1, response_1, score_1, response_2, score_2, 1, 1, score_1 + score_2]
+
+def test_multiline_header(tmp_path):
+    header = list(HEADER)
+    header[8] = '112: Explain gravity.\nUse complete sentences.'
+    rows = [
+        student_row('Zed Alpha', '4', 1.0, 'It pulls\nthings down', 0.0),
+        student_row('Bob Brown', '5', 0.0, 'dunno', 0.0),
+    ]
+    question_data = parse_canvas_csv(write_canvas_csv(tmp_path / 'quiz.csv', header, rows))
+
+    assert list(question_data['question_text'].loc['Question Text']) == ['What is 2+2?', 'Explain gravity.\nUse complete sentences.']
+    assert list(question_data['responses'].index) == ['Zed Alpha', 'Bob Brown']
+    assert question_data['responses'].at['Zed Alpha', 'Question 2'] == 'It pulls\nthings down'
+    assert list(question_data['responses_to_grade']) == ['Question 2']
+    assert list(question_data['max_grades'].loc['Max Grade']) == [1, 2]
+
+def test_responses_are_not_type_inferred(tmp_path):
+    rows = [
+        student_row('Zed Alpha', '4', 1.0, '2023-10-05', 0.0),
+        student_row('Bob Brown', '5', 0.0, 'true', 0.0),
+    ]
+    question_data = parse_canvas_csv(write_canvas_csv(tmp_path / 'quiz.csv', HEADER, rows))
+
+    responses = question_data['responses']
+    assert responses.at['Zed Alpha', 'Question 1'] == '4'
+    assert responses.at['Zed Alpha', 'Question 2'] == '2023-10-05'
+    assert responses.at['Bob Brown', 'Question 2'] == 'true'
+
+def test_cache_is_updated_when_the_csv_changes(tmp_path):
+    csv_file_path = tmp_path / 'quiz.csv'
+    write_canvas_csv(csv_file_path, HEADER, [student_row('Zed Alpha', '4', 1.0, 'dunno', 0.0)])
+    assert list(parse_canvas_csv(csv_file_path)['responses'].index) == ['Zed Alpha']
+    # the second parse comes from the cache
+    assert list(parse_canvas_csv(csv_file_path)['responses'].index) == ['Zed Alpha']
+
+    rows = [student_row('Zed Alpha', '4', 1.0, 'dunno', 0.0), student_row('Bob Brown', '5', 0.0, 'no idea', 0.0)]
+    write_canvas_csv(csv_file_path, HEADER, rows)
+    assert list(parse_canvas_csv(csv_file_path)['responses'].index) == ['Zed Alpha', 'Bob Brown']
+
+    # the cached data for the old version of the file is overwritten
+    assert len(list((tmp_path / '.xlsxgrader-cache').iterdir())) == 1
+
+def test_cache_from_another_version_is_ignored(tmp_path, monkeypatch):
+    csv_file_path = tmp_path / 'quiz.csv'
+    write_canvas_csv(csv_file_path, HEADER, [student_row('Zed Alpha', '4', 1.0, 'dunno', 0.0)])
+    parse_canvas_csv(csv_file_path)
+
+    monkeypatch.setattr(parse_canvas_csv_module, '_parse_canvas_csv', lambda path: 'parsed')
+    monkeypatch.setattr(parse_canvas_csv_module, '_save_cache', lambda *args: None)
+    assert parse_canvas_csv(csv_file_path) != 'parsed'
+    monkeypatch.setattr(parse_canvas_csv_module, '_CACHE_VERSION', -1)
+    assert parse_canvas_csv(csv_file_path) == 'parsed'
+
+def test_header_only(tmp_path):
+    # e.g., a quiz exported before anyone submitted it
+    question_data = parse_canvas_csv(write_canvas_csv(tmp_path / 'quiz.csv', HEADER, []))
+
+    assert len(question_data['responses']) == 0
+    assert list(question_data['grades'].columns) == ['Last Name', 'First Name', 'Question 1', 'Question 2']
+    assert list(question_data['max_grades'].loc['Max Grade']) == [1, 2]
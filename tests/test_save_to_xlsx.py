@@ -0,0 +1,95 @@
+import zipfile
+from xml.etree import ElementTree
+
+from xlsxgrader.parse_canvas_csv import parse_canvas_csv, save_to_xlsx
+
+from test_parse_canvas_csv import HEADER, student_row, write_canvas_csv
+
+def read_sheet_xml(xlsx_file_path, sheet_number):
+    with zipfile.ZipFile(xlsx_file_path) as xlsx_file:
+        return xlsx_file.read(f'xl/worksheets/sheet{sheet_number}.xml').decode()
+
+def test_responses_are_written_as_text(tmp_path):
+    rows = [
+        student_row('Zed Alpha', '4', 1.0, '=1+1', 0.0),
+        student_row('Bob Brown', '5', 0.0, '2023-10-05', 0.0),
+        student_row('Cher', '4', 1.0, '', 0.0),
+    ]
+    question_data = parse_canvas_csv(write_canvas_csv(tmp_path / 'quiz.csv', HEADER, rows))
+    save_to_xlsx(question_data, tmp_path / 'quiz.xlsx')
+
+    # the second question is the third worksheet
+    sheet_xml = read_sheet_xml(tmp_path / 'quiz.xlsx', 3)
+    assert '<f>' not in sheet_xml
+    assert '<t>=1+1</t>' in sheet_xml
+    assert '<t>2023-10-05</t>' in sheet_xml
+
+    # the total scores sheet still uses formulas
+    assert '<f>SUM(' in read_sheet_xml(tmp_path / 'quiz.xlsx', 1)
+
+NAMESPACES = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+def read_cells(xlsx_file_path, sheet_number):
+    """ Read the cells of a worksheet as {reference: value}; formulas are returned as '=...'. """
+    cells = {}
+    for cell in ElementTree.fromstring(read_sheet_xml(xlsx_file_path, sheet_number)).iter(f"{{{NAMESPACES['main']}}}c"):
+        formula = cell.find('main:f', NAMESPACES)
+        text = cell.find('main:is/main:t', NAMESPACES)
+        value = cell.find('main:v', NAMESPACES)
+        if formula is not None:
+            cells[cell.get('r')] = '=' + formula.text
+        elif text is not None:
+            cells[cell.get('r')] = text.text
+        elif value is not None:
+            cells[cell.get('r')] = value.text
+    return cells
+
+def read_sheet_names(xlsx_file_path):
+    """ Read the worksheet names (in order) and the name of the active worksheet. """
+    with zipfile.ZipFile(xlsx_file_path) as xlsx_file:
+        workbook = ElementTree.fromstring(xlsx_file.read('xl/workbook.xml'))
+    sheet_names = [sheet.get('name') for sheet in workbook.iterfind('main:sheets/main:sheet', NAMESPACES)]
+    active_tab = int(workbook.find('main:bookViews/main:workbookView', NAMESPACES).get('activeTab', 0))
+    return sheet_names, sheet_names[active_tab]
+
+def test_workbook_layout(tmp_path):
+    # three questions: the first and third are auto-graded, the second needs grading
+    header = HEADER[:-3] + ['113: Pick one', '1.0'] + HEADER[-3:]
+    rows = [
+        student_row('Zed Alpha', '4', 1.0, 'gravity pulls', 0.0)[:-3] + ['B', 1.0, 2, 1, 2.0],
+        student_row('Mary Ann Smith', '5', 0.0, 'mass attracts mass', 0.0)[:-3] + ['A', 0.0, 0, 3, 0.0],
+        student_row('Bob Brown', '4', 1.0, 'dunno', 0.0)[:-3] + ['B', 1.0, 2, 1, 2.0],
+    ]
+    question_data = parse_canvas_csv(write_canvas_csv(tmp_path / 'quiz.csv', header, rows))
+    save_to_xlsx(question_data, tmp_path / 'quiz.xlsx')
+
+    sheet_names, active_sheet = read_sheet_names(tmp_path / 'quiz.xlsx')
+    assert sheet_names == ['Total Scores', 'Question 1', 'Question 2', 'Question 3']
+    # the active sheet is the first question that needs grading
+    assert active_sheet == 'Question 2'
+
+    total_scores = read_cells(tmp_path / 'quiz.xlsx', 1)
+    question_sheets = {name: read_cells(tmp_path / 'quiz.xlsx', n + 1) for n, name in enumerate(sheet_names) if n > 0}
+    assert total_scores['D1'] == 'Max Score: 4'
+
+    # the students are sorted by last name and start on row 3 of every sheet
+    students = ['Zed Alpha', 'Bob Brown', 'Mary Ann Smith']
+    for row, student in enumerate(students, start=3):
+        assert total_scores[f'A{row}'] == student
+        for cells in question_sheets.values():
+            assert cells[f'A{row}'] == student
+
+        # the total score adds up the scores in the same row of every question sheet
+        assert total_scores[f'D{row}'] == f"=SUM('Question 1'!C{row},'Question 2'!C{row},'Question 3'!C{row})"
+
+        # the comments only cover the questions that need grading
+        assert total_scores[f'E{row}'] == (
+            f"""=CONCATENATE("Question 2 (",'Question 2'!C{row},"/",'Question 2'!D{row},") ",'Question 2'!E{row})"""
+        )
+    assert f'A{len(students) + 3}' not in total_scores
+
+    # spot check the question sheet contents
+    assert question_sheets['Question 2']['C1'] == 'Explain gravity.'
+    assert question_sheets['Question 2']['B5'] == 'mass attracts mass'
+    assert question_sheets['Question 2']['D5'] == '2'
+    assert question_sheets['Question 3']['C5'] == '0'
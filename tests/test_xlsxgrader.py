@@ -0,0 +1,21 @@
+import sys
+
+import pytest
+
+from xlsxgrader import main_cli
+
+from test_parse_canvas_csv import HEADER, student_row, write_canvas_csv
+
+@pytest.mark.parametrize('file_names', [('quiz.csv', 'quiz.csv'), ('Quiz.csv', 'quiz.csv')])
+def test_duplicate_output_files_are_rejected(tmp_path, monkeypatch, capsys, file_names):
+    rows = [student_row('Zed Alpha', '4', 1.0, 'dunno', 0.0)]
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    files = [write_canvas_csv(tmp_path / directory / file_name, HEADER, rows) for directory, file_name in zip(['a', 'b'], file_names)]
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['xlsxgrader'] + [str(file) for file in files])
+    main_cli()
+
+    assert "same output file" in capsys.readouterr().out
+    assert list(tmp_path.glob('*.xlsx')) == []